@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Benchmark of bulk bcrypt throughput against the number of workers
+"""
+import os
+import sys
+import time
+from encrypt_password import verify_passwords_bulk
+from filtered_logger import hash_passwords_bulk
+
+
+def run(count: int, rounds: int):
+    """
+    Hashes and verifies count passwords with 1 to cpu_count workers
+    """
+    passwords = [f"password{i}" for i in range(count)]
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        hashed = hash_passwords_bulk(passwords, rounds, workers)
+        hashing = time.perf_counter() - start
+
+        start = time.perf_counter()
+        assert all(verify_passwords_bulk(hashed, passwords, workers))
+        verifying = time.perf_counter() - start
+
+        print(f"workers={workers:>3} rounds={rounds}: "
+              f"hash {count / hashing:8.1f}/s, "
+              f"verify {count / verifying:8.1f}/s")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    run(count, rounds)
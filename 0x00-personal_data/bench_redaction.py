@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the regex and token redaction backends
+"""
+import sys
+import time
+from filtered_logger import (PII_FIELDS, RedactingFormatter,
+                             filter_datum, format_user_row)
+
+
+def synthetic_rows(count: int):
+    """
+    Yields rows shaped like the users table
+    """
+    for i in range(count):
+        yield (f"user{i}", f"user{i}@example.com", f"555-01{i % 100:02d}",
+               f"{i % 1000:03d}-45-6789", f"pwd{i}", f"10.0.{i % 256}.1",
+               "2019-11-14 06:16:24", "Mozilla/5.0 (X11; Linux x86_64)")
+
+
+def run(count: int):
+    """
+    Times both backends on count synthetic messages
+    """
+    messages = [format_user_row(row) for row in synthetic_rows(count)]
+    for backend in ("regex", "token"):
+        start = time.perf_counter()
+        for message in messages:
+            filter_datum(PII_FIELDS, RedactingFormatter.REDACTION, message,
+                         RedactingFormatter.SEPARATOR, backend)
+        elapsed = time.perf_counter() - start
+        print(f"{backend:>5} {count:>8} lines: {elapsed:.3f}s "
+              f"({count / elapsed:,.0f} lines/s)")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    for size in sizes:
+        run(size)
@@ -3,7 +3,9 @@
 Module to encrypt password
 """
 import bcrypt
-from filtered_logger import hash_password
+from concurrent.futures import ProcessPoolExecutor
+from filtered_logger import hash_password, needs_rehash
+from typing import List, Tuple
 
 
 def is_valid(hashed_password: bytes, password: str) -> bool:
@@ -14,3 +16,26 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     Return: True if the password matches the hashed password
     """
     return bcrypt.checkpw(password.encode(), hashed_password)
+
+
+def check_password(hashed_password: bytes,
+                   password: str) -> Tuple[bool, bool]:
+    """
+    Validates a password and flags a stale cost factor
+    Return: (valid, rehash) where rehash is True when the password is
+    valid and its hash is cheaper than the calibrated cost, so the
+    caller should store hash_password(password) in its place
+    """
+    valid = is_valid(hashed_password, password)
+    return valid, valid and needs_rehash(hashed_password)
+
+
+def verify_passwords_bulk(hashed_passwords: List[bytes], passwords: List[str],
+                          workers: int = None) -> List[bool]:
+    """
+    Validates pairs of hashed and plain passwords on a pool of
+    worker processes (os.cpu_count() workers by default)
+    Return: the results in the order of the pairs
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(is_valid, hashed_passwords, passwords))
@@ -2,27 +2,119 @@
 """
 A module for logging personal data
 """
+import atexit
 import logging
+import logging.handlers
 import re
 import os
+import queue
+import sys
+import threading
+import time
 import mysql.connector
-from typing import List
+import mysql.connector.pooling
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from typing import Iterator, List, TextIO, Tuple
 import bcrypt
 
 
 # Constants
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+ENGINE_CACHE_SIZE = 128
+BATCH_SIZE = 1000
+QUEUE_SIZE = 10000
+POOL_SIZE = 5
+POOL_CHECKOUT_ATTEMPTS = 2
+BCRYPT_MIN_ROUNDS = 12
+BCRYPT_MAX_ROUNDS = 16
+BCRYPT_BUDGET_MS = 250
+
+
+class RedactionEngine:
+    """
+    Redaction pattern compiled once for a set of fields
+    """
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str):
+        """
+        Compile the pattern and the replacement template
+        """
+        self.fields = fields
+        self.redaction = redaction
+        self.separator = separator
+        self.pattern = re.compile(f"({'|'.join(fields)})=[^{separator}]*")
+        self.template = r"\g<1>=" + redaction.replace("\\", "\\\\")
+
+    def redact(self, message: str) -> str:
+        """
+        Returns the message with the engine fields obfuscated
+        """
+        return self.pattern.sub(self.template, message)
+
+
+class TokenRedactionEngine:
+    """
+    Single pass redaction of key=value messages without regex.
+    Unlike the regex engine, only whole keys are matched
+    """
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str):
+        """
+        Store the fields as a frozenset for constant time lookups
+        """
+        self.fields = fields
+        self.redaction = redaction
+        self.separator = separator
+        self.keys = frozenset(fields)
+
+    def redact(self, message: str) -> str:
+        """
+        Returns the message with the engine fields obfuscated
+        """
+        tokens = message.split(self.separator)
+        for i, token in enumerate(tokens):
+            key, equal, _ = token.partition("=")
+            if equal and key.lstrip() in self.keys:
+                tokens[i] = f"{key}={self.redaction}"
+        return self.separator.join(tokens)
+
+
+ENGINES = {
+    "regex": RedactionEngine,
+    "token": TokenRedactionEngine,
+}
+
+
+@lru_cache(maxsize=ENGINE_CACHE_SIZE)
+def _cached_engine(backend: str, fields: Tuple[str, ...], redaction: str,
+                   separator: str) -> RedactionEngine:
+    """
+    Builds the engine for a hashable configuration
+    """
+    if backend not in ENGINES:
+        raise ValueError(f"Unknown redaction backend: {backend}")
+    return ENGINES[backend](fields, redaction, separator)
+
+
+def get_engine(fields: List[str], redaction: str,
+               separator: str, backend: str = "regex") -> RedactionEngine:
+    """
+    Returns the cached redaction engine for the given configuration
+    """
+    return _cached_engine(backend, tuple(fields), redaction, separator)
 
 
 def filter_datum(fields: List[str], redaction: str,
-                 message: str, separator: str) -> str:
+                 message: str, separator: str,
+                 backend: str = "regex") -> str:
     """
     Returns the log message with specified fields obfuscated
     """
-    return re.sub(
-        f"({'|'.join(fields)})=[^{separator}]*",
-        lambda match: f"{match.group().split('=')[0]}={redaction}", message
-        )
+    return get_engine(fields, redaction, separator, backend).redact(message)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -34,79 +126,435 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], backend: str = "regex"):
         """
         Initialize the Redacting Formatter with specific fields
+        backend selects the redaction engine: "regex" or "token"
         """
         super().__init__(self.FORMAT)
         self.fields = fields
+        self.engine = get_engine(fields, self.REDACTION, self.SEPARATOR,
+                                 backend)
 
     def format(self, record: logging.LogRecord) -> str:
         """
         Format the log record with sensitive fields obfuscated
         """
-        record.msg = filter_datum(self.fields, self.REDACTION,
-                                  record.getMessage(), self.SEPARATOR)
+        record.msg = self.engine.redact(record.getMessage())
         return super().format(record)
 
 
-def get_logger() -> logging.Logger:
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler for a bounded queue
+    When the queue is full, records either wait for a free slot
+    or are dropped and counted, depending on block
+    """
+
+    def __init__(self, records: queue.Queue, block: bool = True):
+        """
+        Initialize the handler with its overflow policy
+        """
+        super().__init__(records)
+        self.block = block
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        """
+        Enqueue a record, applying the overflow policy
+        """
+        try:
+            self.queue.put(record, block=self.block)
+        except queue.Full:
+            self.dropped += 1
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """
+    Queue listener that waits for room for its stop sentinel,
+    so every record queued before stop() is still emitted
+    """
+
+    def enqueue_sentinel(self):
+        """
+        Blocking put of the stop sentinel
+        """
+        self.queue.put(self._sentinel)
+
+
+_listeners = []
+
+
+def stop_listeners():
+    """
+    Flushes the queued records and stops the background listeners
+    """
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(stop_listeners)
+
+
+_logger_lock = threading.Lock()
+_logger_config = None
+
+
+def configure_logger(async_mode: bool = False, queue_size: int = QUEUE_SIZE,
+                     block: bool = True) -> logging.Logger:
+    """
+    Replaces the handlers of the user_data logger with a single
+    handler for the given configuration
+    With async_mode set, records go through a bounded queue of
+    queue_size records and are redacted and written by a background
+    QueueListener; block chooses between waiting and dropping
+    when the queue is full
+    """
+    global _logger_config
+
+    with _logger_lock:
+        logger = logging.getLogger("user_data")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        stop_listeners()
+
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(RedactingFormatter(fields=PII_FIELDS))
+        if async_mode:
+            records = queue.Queue(maxsize=queue_size)
+            listener = FlushingQueueListener(records, stream_handler)
+            listener.start()
+            _listeners.append(listener)
+            logger.addHandler(BoundedQueueHandler(records, block))
+        else:
+            logger.addHandler(stream_handler)
+
+        _logger_config = (async_mode, queue_size, block)
+        return logger
+
+
+def get_logger(async_mode: bool = None, queue_size: int = None,
+               block: bool = None) -> logging.Logger:
     """
-    Creates and returns a logger with specific settings
+    Returns the user_data logger as currently configured
+    The first call configures it, with the given settings or the
+    defaults of configure_logger; later calls never reconfigure it:
+    only configure_logger replaces its handlers, and settings
+    different from the current ones raise a ValueError
     """
-    logger = logging.getLogger("user_data")
-    logger.setLevel(logging.INFO)
-    logger.propagate = False
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(RedactingFormatter(fields=PII_FIELDS))
-    logger.addHandler(stream_handler)
-    return logger
+    requested = (async_mode, queue_size, block)
+    with _logger_lock:
+        current = _logger_config
+    if current is None:
+        defaults = (False, QUEUE_SIZE, True)
+        return configure_logger(*(default if value is None else value
+                                  for value, default
+                                  in zip(requested, defaults)))
+    if any(value is not None and value != configured
+           for value, configured in zip(requested, current)):
+        raise ValueError("user_data logger already configured as "
+                         f"{current}, use configure_logger to change it")
+    return logging.getLogger("user_data")
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
+def _db_config() -> dict:
+    """
+    Returns the connection settings from the environment
+    """
+    return {
+        "user": os.getenv("PERSONAL_DATA_DB_USERNAME", "root"),
+        "password": os.getenv("PERSONAL_DATA_DB_PASSWORD", ""),
+        "host": os.getenv("PERSONAL_DATA_DB_HOST", "localhost"),
+        "database": os.getenv("PERSONAL_DATA_DB_NAME"),
+    }
+
+
+_pool_lock = threading.Lock()
+_pool = None
+
+
+def get_db_pool() -> mysql.connector.pooling.MySQLConnectionPool:
+    """
+    Returns the shared connection pool, created on first use
+    Its size comes from PERSONAL_DATA_DB_POOL_SIZE and its name
+    from PERSONAL_DATA_DB_POOL_NAME
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name=os.getenv("PERSONAL_DATA_DB_POOL_NAME",
+                                    "personal_data"),
+                pool_size=int(os.getenv("PERSONAL_DATA_DB_POOL_SIZE",
+                                        POOL_SIZE)),
+                **_db_config()
+            )
+        return _pool
+
+
+def get_db(pooled: bool = False) -> mysql.connector.connection.MySQLConnection:
     """
     Returns a connector to the secure database
+    With pooled set, the connection is checked out of the shared pool,
+    pinged (reconnecting if the server dropped it) and goes back to
+    the pool when closed
+    A connection failing the ping is given back to the pool, so it
+    is reconnected on a later checkout, and the checkout is retried
+    up to POOL_CHECKOUT_ATTEMPTS times before the error is raised
+    """
+    if not pooled:
+        return mysql.connector.connect(**_db_config())
+
+    for attempt in range(1, POOL_CHECKOUT_ATTEMPTS + 1):
+        db = get_db_pool().get_connection()
+        try:
+            db.ping(reconnect=True, attempts=1, delay=0)
+            return db
+        except mysql.connector.Error:
+            try:
+                db.close()
+            except Exception:
+                # the connection is back in the pool even if its
+                # session reset failed
+                pass
+            if attempt == POOL_CHECKOUT_ATTEMPTS:
+                raise
+
+
+def format_user_row(row: tuple) -> str:
+    """
+    Builds the log message for a row of the users table
+    """
+    (name, email, phone, ssn, password,
+     ip, last_login, user_agent) = row
+    return (
+        f"name={name}; email={email}; phone={phone}; ssn={ssn}; "
+        f"password={password}; ip={ip}; last_login={last_login}; "
+        f"user_agent={user_agent};"
+        )
+
+
+def fetch_batches(cursor, batch_size: int = BATCH_SIZE) -> Iterator[list]:
+    """
+    Yields the pending rows of an executed cursor in batches
+    of at most batch_size rows
+    """
+    rows = cursor.fetchmany(batch_size)
+    while rows:
+        yield rows
+        rows = cursor.fetchmany(batch_size)
+
+
+def _redact_batch(rows: list) -> List[str]:
+    """
+    Worker stage: builds and formats the redacted log lines of a batch
+    """
+    formatter = RedactingFormatter(fields=PII_FIELDS)
+    return [
+        formatter.format(logging.LogRecord(
+            "user_data", logging.INFO, __file__, 0,
+            format_user_row(row), None, None))
+        for row in rows
+        ]
+
+
+def _write_batches(pending: queue.Queue, output: TextIO, errors: list):
+    """
+    Writer stage: writes the worker results in submission order
+    The first worker or output error is appended to errors; the
+    remaining futures are then cancelled but still drained, so the
+    producer never blocks on a full queue
+    """
+    while True:
+        future = pending.get()
+        if future is None:
+            break
+        if errors:
+            future.cancel()
+            continue
+        try:
+            output.write("".join(f"{line}\n" for line in future.result()))
+        except Exception as e:
+            errors.append(e)
+    try:
+        output.flush()
+    except Exception as e:
+        errors.append(e)
+
+
+def pipeline_user_data(cursor, workers: int, batch_size: int = BATCH_SIZE,
+                       output: TextIO = None) -> int:
     """
-    username = os.getenv("PERSONAL_DATA_DB_USERNAME", "root")
-    password = os.getenv("PERSONAL_DATA_DB_PASSWORD", "")
-    host = os.getenv("PERSONAL_DATA_DB_HOST", "localhost")
-    database = os.getenv("PERSONAL_DATA_DB_NAME")
-    return mysql.connector.connect(
-        user=username,
-        password=password,
-        host=host,
-        database=database
-    )
+    Redacts the rows of an executed cursor on a pool of worker processes
+    The calling thread fetches batches, workers build and redact the
+    messages and a single writer thread emits them in order to output
+    (stderr by default, like the logger handler)
+    At most 2 batches per worker are in flight, so fetching blocks
+    when the workers or the writer fall behind
+    A worker or output error stops the fetching, cancels the batches
+    in flight and is raised here
+    Returns the number of rows written
+    """
+    output = output if output is not None else sys.stderr
+    pending = queue.Queue(maxsize=2 * workers)
+    errors = []
+    writer = threading.Thread(target=_write_batches,
+                              args=(pending, output, errors))
+    count = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        writer.start()
+        try:
+            for rows in fetch_batches(cursor, batch_size):
+                if errors:
+                    break
+                pending.put(pool.submit(_redact_batch, rows))
+                count += len(rows)
+        finally:
+            pending.put(None)
+            writer.join()
+
+    if errors:
+        raise errors[0]
+    return count
 
 
-def log_user_data():
+def log_user_data(stream: bool = False, batch_size: int = BATCH_SIZE,
+                  workers: int = 0):
     """
     Logs user data from the database
+    With stream set, rows are read from an unbuffered cursor in
+    batches of batch_size so memory stays flat on large tables,
+    and a row count/throughput summary is logged at the end
+    With workers set, rows are streamed through pipeline_user_data
     """
     db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM users;")
+    try:
+        streaming = stream or workers > 0
+        cursor = db.cursor(buffered=False) if streaming else db.cursor()
+        try:
+            cursor.execute("SELECT * FROM users;")
+            _log_rows(cursor, streaming, batch_size, workers)
+        except BaseException:
+            _close_quietly(cursor)
+            raise
+        cursor.close()
+    except BaseException:
+        _close_quietly(db)
+        raise
+    db.close()
+
+
+def _close_quietly(resource):
+    """
+    Closes a cursor or connection while an error is raised: closing
+    an unbuffered cursor with rows left unread raises, and must not
+    replace the error
+    """
+    try:
+        resource.close()
+    except mysql.connector.Error:
+        pass
+
+
+def _log_rows(cursor, streaming: bool, batch_size: int, workers: int):
+    """
+    Logs the rows of an executed cursor for log_user_data
+    """
     logger = get_logger()
 
-    for (name, email, phone, ssn, password,
-         ip, last_login, user_agent) in cursor:
-        message = (
-            f"name={name}; email={email}; phone={phone}; ssn={ssn}; "
-            f"password={password}; ip={ip}; last_login={last_login}; "
-            f"user_agent={user_agent};"
-            )
-        logger.info(message)
+    if not streaming:
+        for row in cursor:
+            logger.info(format_user_row(row))
+        return
 
-    cursor.close()
-    db.close()
+    count = 0
+    start = time.perf_counter()
+    if workers > 0:
+        count = pipeline_user_data(cursor, workers, batch_size)
+    else:
+        for rows in fetch_batches(cursor, batch_size):
+            for row in rows:
+                logger.info(format_user_row(row))
+            count += len(rows)
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0
+    logger.info(f"rows={count}; elapsed={elapsed:.3f}s; "
+                f"rate={rate:.0f} rows/s;")
 
 
-def hash_password(password: str) -> bytes:
+def calibrate_rounds(budget_ms: float = BCRYPT_BUDGET_MS) -> int:
+    """
+    Times bcrypt on this machine and returns the highest cost factor
+    whose hashing time fits in budget_ms milliseconds, never less than
+    BCRYPT_MIN_ROUNDS (bcrypt's default cost): a loaded node or a
+    small budget must not produce weak hashes
+    0x03-user_authentication_service/auth.py keeps an identical copy:
+    the projects are deployed separately and share no package
+    """
+    rounds = BCRYPT_MIN_ROUNDS
+    while rounds < BCRYPT_MAX_ROUNDS:
+        salt = bcrypt.gensalt(rounds + 1)
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        if (time.perf_counter() - start) * 1000 > budget_ms:
+            break
+        rounds += 1
+    return rounds
+
+
+_rounds = None
+
+
+def get_rounds() -> int:
+    """
+    Returns the cost factor for new hashes, calibrated on first use
+    against PERSONAL_DATA_BCRYPT_BUDGET_MS (milliseconds)
+    """
+    global _rounds
+
+    if _rounds is None:
+        budget_ms = float(os.getenv("PERSONAL_DATA_BCRYPT_BUDGET_MS",
+                                    BCRYPT_BUDGET_MS))
+        _rounds = calibrate_rounds(budget_ms)
+    return _rounds
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Returns True if hashed_password was made with a lower cost factor
+    than the calibrated one, so it should be rehashed once the
+    password is known to be valid
+    """
+    return int(hashed_password.split(b"$")[2]) < get_rounds()
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Hashes a password with bcrypt and returns the salted,
     hashed password
+    rounds is the bcrypt cost factor, calibrated by default
+    """
+    if rounds is None:
+        rounds = get_rounds()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds))
+
+
+def hash_passwords_bulk(passwords: List[str], rounds: int = None,
+                        workers: int = None) -> List[bytes]:
+    """
+    Hashes a batch of passwords on a pool of worker processes
+    (os.cpu_count() workers by default)
+    Returns the hashes in the order of passwords
     """
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    if rounds is None:
+        rounds = get_rounds()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hash_password, passwords, repeat(rounds)))
 
 
 if __name__ == "__main__":
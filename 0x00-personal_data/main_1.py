@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Main 1
+get_logger returns the configured logger: repeated calls add no
+handler and the cost per record doesn't grow with the number of calls
+"""
+import io
+import sys
+import time
+
+sys.stderr = io.StringIO()
+from filtered_logger import configure_logger, get_logger  # noqa: E402
+
+
+def cost_per_record(records: int = 2000) -> float:
+    """
+    Microseconds per record logged through get_logger()
+    """
+    start = time.perf_counter()
+    for i in range(records):
+        get_logger().info(f"name=bob{i}; email=bob{i}@hbtn.io; ip=10.0.0.1;")
+    return (time.perf_counter() - start) * 1e6 / records
+
+
+if __name__ == "__main__":
+    logger = configure_logger(async_mode=True)
+    first = cost_per_record()
+    for _ in range(100000):
+        get_logger()
+    after = cost_per_record()
+    handlers = [type(handler).__name__ for handler in get_logger().handlers]
+
+    sys.stderr = sys.__stderr__
+    print(f"handlers after 100000 calls: {handlers}")
+    print(f"same logger: {get_logger() is logger}")
+    print(f"cost per record: {first:.1f}us first, {after:.1f}us after")
+    print(f"cost grows: {after > 2 * first}")
+    try:
+        get_logger(async_mode=False)
+    except ValueError:
+        print("other settings need configure_logger")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Main 2
+get_db against a sqlite-backed stand-in of mysql.connector and its pool,
+so no MySQL server is needed: failed health checks give their
+connection back to the pool, and log_user_data reads the users table
+and raises the output error of a pipeline stopped with rows unread
+"""
+import io
+import queue
+import sqlite3
+import sys
+import mysql.connector
+from mysql.connector.errors import InterfaceError, InternalError, PoolError
+import filtered_logger
+
+SERVER = {"up": True, "dropping": False}
+USERS = [("bob", "bob@hbtn.io", "555-0100", "123-45-6789", "pwd",
+          "10.0.0.1", "2019-11-14 06:16:24", "Mozilla/5.0")] * 3
+
+
+class Connection:
+    """
+    DB-API connection on sqlite with the mysql.connector calls used
+    """
+
+    def __init__(self, **kwargs):
+        self.db = sqlite3.connect(":memory:")
+        self.db.execute("CREATE TABLE users (name, email, phone, ssn, "
+                        "password, ip, last_login, user_agent)")
+        self.db.executemany(
+            "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)", USERS)
+        self.stale = False
+        self.closed = False
+
+    def is_connected(self) -> bool:
+        return SERVER["up"] and not self.stale
+
+    def reconnect(self):
+        if not SERVER["up"]:
+            raise InterfaceError("Can't connect to MySQL server")
+        self.stale = False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self.is_connected() or SERVER["dropping"]:
+            raise InterfaceError("MySQL server has gone away")
+
+    def cursor(self, buffered=None):
+        return Cursor(self.db.cursor(), buffered is not False)
+
+    def close(self):
+        self.closed = True
+        self.db.close()
+
+
+class Cursor:
+    """
+    Cursor on sqlite: like mysql.connector, closing an unbuffered
+    cursor with rows left unread raises
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor, buffered: bool):
+        self.cursor = cursor
+        self.buffered = buffered
+        self.unread = False
+
+    def execute(self, query: str):
+        self.cursor.execute(query)
+        self.unread = not self.buffered
+
+    def fetchmany(self, size: int) -> list:
+        rows = self.cursor.fetchmany(size)
+        self.unread = self.unread and len(rows) == size
+        return rows
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def close(self):
+        if self.unread:
+            raise InternalError("Unread result found")
+        self.cursor.close()
+
+
+class BrokenOutput(io.StringIO):
+    """
+    Output failing on the first write
+    """
+
+    def write(self, text: str):
+        raise OSError("No space left on device")
+
+
+class PooledConnection:
+    """
+    Pooled connection: close gives the connection back to its pool,
+    even when resetting its session fails
+    """
+
+    def __init__(self, pool, cnx: Connection):
+        self.pool = pool
+        self.cnx = cnx
+
+    def ping(self, **kwargs):
+        self.cnx.ping(**kwargs)
+
+    def close(self):
+        try:
+            if not self.cnx.is_connected():
+                raise InterfaceError("reset_session failed")
+        finally:
+            self.pool.connections.put(self.cnx)
+
+
+class Pool:
+    """
+    Fixed size pool reconnecting dropped connections on checkout,
+    like mysql.connector.pooling.MySQLConnectionPool
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.connections = queue.Queue()
+        for _ in range(size):
+            self.connections.put(Connection())
+
+    def get_connection(self) -> PooledConnection:
+        try:
+            cnx = self.connections.get(block=False)
+        except queue.Empty:
+            raise PoolError("Failed getting connection; pool exhausted")
+        if not cnx.is_connected():
+            try:
+                cnx.reconnect()
+            except InterfaceError:
+                self.connections.put(cnx)
+                raise
+        return PooledConnection(self, cnx)
+
+
+def checkouts(count: int) -> list:
+    """
+    Names of the errors raised by count pooled checkouts
+    """
+    errors = []
+    for _ in range(count):
+        try:
+            filtered_logger.get_db(pooled=True).close()
+        except (InterfaceError, PoolError) as e:
+            errors.append(type(e).__name__)
+    return errors
+
+
+if __name__ == "__main__":
+    pool = Pool(2)
+    filtered_logger._pool = pool
+
+    SERVER["up"] = False
+    print(f"checkouts while down: {checkouts(5)}")
+    SERVER["up"] = True
+    print(f"pool slots left: {pool.connections.qsize()}/{pool.size}")
+    SERVER["dropping"] = True
+    print(f"checkouts while dropping: {checkouts(5)}")
+    SERVER["dropping"] = False
+    print(f"pool slots left: {pool.connections.qsize()}/{pool.size}")
+    db = filtered_logger.get_db(pooled=True)
+    print(f"checkout once up: {db.cnx.is_connected()}")
+    db.close()
+
+    pool.connections.queue[0].stale = True
+    db = filtered_logger.get_db(pooled=True)
+    print(f"stale connection skipped: {db.cnx.is_connected()}")
+    db.close()
+
+    connections = []
+
+    def connect(**kwargs) -> Connection:
+        connections.append(Connection(**kwargs))
+        return connections[-1]
+
+    mysql.connector.connect = connect
+    output = sys.stderr = io.StringIO()
+    filtered_logger.configure_logger()
+    filtered_logger.log_user_data()
+    filtered_logger.log_user_data(stream=True, batch_size=2)
+    sys.stderr = sys.__stderr__
+    lines = output.getvalue().splitlines()
+    print(f"rows logged: {sum('email=***' in line for line in lines)}")
+    print(f"ssn in clear: {any('123-45-6789' in line for line in lines)}")
+    print(f"connections closed: {all(cnx.closed for cnx in connections)}")
+
+    USERS *= 100
+    sys.stderr = BrokenOutput()
+    try:
+        filtered_logger.log_user_data(batch_size=1, workers=1)
+    except Exception as e:
+        error = type(e).__name__
+    sys.stderr = sys.__stderr__
+    print(f"pipeline output failure raises: {error}")
+    print(f"connections closed: {all(cnx.closed for cnx in connections)}")
@@ -2,6 +2,7 @@
 """
 Route module for the API
 """
+from api.v1.auth.auth import ExcludedPaths
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -15,6 +16,10 @@ app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
 AUTH_TYPE = getenv("AUTH_TYPE")
+EXCLUDED_PATHS = ExcludedPaths(['/api/v1/status/',
+                                '/api/v1/unauthorized/',
+                                '/api/v1/forbidden/',
+                                '/api/v1/auth_session/login/'])
 
 if AUTH_TYPE == "auth":
     from api.v1.auth.auth import Auth
@@ -66,12 +71,7 @@ def before_request() -> str:
     if auth is None:
         return
 
-    excluded_paths = ['/api/v1/status/',
-                      '/api/v1/unauthorized/',
-                      '/api/v1/forbidden/',
-                      '/api/v1/auth_session/login/']
-
-    if not auth.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
 
     if auth.authorization_header(request) is None \
@@ -3,14 +3,78 @@
 A module for API auth class
 """
 from flask import request
-from typing import List, TypeVar
+from functools import lru_cache
+from typing import Iterable, List, TypeVar, Union
+
+
+class ExcludedPaths:
+    """
+    Excluded paths compiled once for require_auth: exact paths
+    in a set, prefixes of the paths ending by * in a character trie,
+    so matching a path doesn't depend on the number of excluded paths
+    """
+    END = ""
+
+    def __init__(self, excluded_paths: Iterable[str] = ()):
+        """
+        Constructor Method
+        """
+        self.exact = set()
+        self.prefixes = {}
+        self.size = 0
+        for excluded_path in excluded_paths:
+            self.add(excluded_path)
+
+    def add(self, excluded_path: str):
+        """
+        Add an excluded path, a prefix if it ends by *
+        """
+        self.size += 1
+        if not excluded_path.endswith('*'):
+            self.exact.add(excluded_path)
+            return
+        node = self.prefixes
+        for char in excluded_path[:-1]:
+            node = node.setdefault(char, {})
+        node[self.END] = True
+
+    def match(self, path: str) -> bool:
+        """
+        Returns True if path, ending by a /, is excluded
+        """
+        if path in self.exact or path + '/' in self.exact:
+            return True
+        node = self.prefixes
+        for char in path:
+            if self.END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return self.END in node
+
+    def __len__(self) -> int:
+        """
+        Number of excluded paths
+        """
+        return self.size
+
+
+@lru_cache(maxsize=32)
+def compile_excluded_paths(excluded_paths: tuple) -> ExcludedPaths:
+    """
+    ExcludedPaths of a tuple of excluded paths, compiled once per tuple
+    """
+    return ExcludedPaths(excluded_paths)
 
 
 class Auth:
     """
     A class that defines routes that require authentication
     """
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], ExcludedPaths]
+                     ) -> bool:
         """
         Returns false
         Returns True if path is None
@@ -20,6 +84,7 @@ class Auth:
         This method must be slash tolerant:
         path=/api/v1/status and path=/api/v1/status/
         must be returned False if excluded_paths contains /api/v1/status/
+        A list of excluded_paths is compiled once to ExcludedPaths
         """
         if path is None:
             return True
@@ -27,21 +92,14 @@ class Auth:
         if not excluded_paths:
             return True
 
+        if not isinstance(excluded_paths, ExcludedPaths):
+            excluded_paths = compile_excluded_paths(tuple(excluded_paths))
+
         if not path.endswith('/'):
             path += '/'
 
-        for excluded_path in excluded_paths:
-            # Normalize the excluded path
-            if excluded_path.endswith('*'):
-                # Check if the path matches the prefix before the '*'
-                if path.startswith(excluded_path[:-1]):
-                    return False
-            else:
-                # Match exact path with trailing slash normalization
-                if path == excluded_path or path + '/' == excluded_path:
-                    return False
-
-        return True
+        return not excluded_paths.match(path)
+
     def authorization_header(self, request=None) -> str:
         """
         Returns none
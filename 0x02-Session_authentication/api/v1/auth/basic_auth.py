@@ -3,34 +3,193 @@
 Module of Basic Authentication
 """
 from api.v1.auth.auth import Auth
-from base64 import b64decode
+from binascii import a2b_base64
+from collections import OrderedDict
 from models.user import User
-from typing import TypeVar
+from os import getenv
+from typing import Optional, Tuple, TypeVar
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+
+CACHE_SIZE = 1024
+CACHE_TTL = 60
+MAX_HEADER_LENGTH = 4096
+BASIC_PREFIX = "Basic "
+
+
+def decode_base64(encoded: str) -> Optional[bytes]:
+    """
+    Decode base64 from an ASCII str,
+    None if malformed or longer than MAX_HEADER_LENGTH
+    """
+    if len(encoded) > MAX_HEADER_LENGTH:
+        return None
+    try:
+        return a2b_base64(encoded)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def parse_basic_authorization(header: str
+                              ) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Email and password of a Basic Authorization header, in one pass:
+    the header is rejected early when too long, not ASCII, not Basic
+    or without credentials. a2b_base64 reads the ASCII str directly,
+    so the base64 part is copied once, without an encode to bytes
+    """
+    if type(header) is not str or len(header) > MAX_HEADER_LENGTH:
+        return None, None
+    if not header.isascii() or not header.startswith(BASIC_PREFIX):
+        return None, None
+    try:
+        decoded = a2b_base64(header[len(BASIC_PREFIX):]).decode('utf-8')
+    except (binascii.Error, ValueError):
+        return None, None
+    email, separator, pwd = decoded.partition(':')
+    if not separator:
+        return None, None
+    return email, pwd
+
+
+class CredentialCache():
+    """
+    Bounded LRU cache of verified Authorization headers: the keyed
+    hash (HMAC) of a header maps to the user ID, email and password
+    hash it was verified against, for ttl seconds
+    An entry is dropped when the user was removed or its email or
+    password changed since, so a hit never skips a needed check
+    """
+
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        """
+        Constructor Method
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.key = os.urandom(32)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, header: str) -> bytes:
+        """
+        Keyed hash of a header: headers are never stored
+        """
+        return hmac.new(self.key, header.encode('utf-8', 'surrogatepass'),
+                        hashlib.sha256).digest()
+
+    def get(self, header: str) -> TypeVar('User'):
+        """
+        User verified for header, or None
+        """
+        digest = self.digest(header)
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None:
+                if entry[3] > time.monotonic():
+                    self.entries.move_to_end(digest)
+                else:
+                    del self.entries[digest]
+                    entry = None
+        user = None
+        if entry is not None:
+            user = User.get(entry[0])
+            if user is None or user.email != entry[1] \
+                    or user.password != entry[2]:
+                self.invalidate(digest)
+                user = None
+        with self.lock:
+            if user is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return user
+
+    def put(self, header: str, user: TypeVar('User')):
+        """
+        Cache the user verified for header
+        """
+        if self.max_size <= 0:
+            return
+        digest = self.digest(header)
+        with self.lock:
+            self.entries[digest] = (user.id, user.email, user.password,
+                                    time.monotonic() + self.ttl)
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, digest: bytes):
+        """
+        Drop the entry of a header digest
+        """
+        with self.lock:
+            self.entries.pop(digest, None)
+
+    def clear(self):
+        """
+        Drop all entries
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Hit and miss counters and number of entries
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self.entries)}
+
+
+def get_credential_cache() -> CredentialCache:
+    """
+    Credential cache sized by the BASIC_AUTH_CACHE_SIZE environment
+    variable, with entries valid BASIC_AUTH_CACHE_TTL seconds
+    """
+    try:
+        max_size = int(getenv("BASIC_AUTH_CACHE_SIZE"))
+    except Exception:
+        max_size = CACHE_SIZE
+    try:
+        ttl = float(getenv("BASIC_AUTH_CACHE_TTL"))
+    except Exception:
+        ttl = CACHE_TTL
+    return CredentialCache(max_size, ttl)
 
 
 class BasicAuth(Auth):
     """
     Basic Authentication Class
+    Verified Authorization headers are cached by credential_cache
     """
 
+    def __init__(self):
+        """
+        Constructor Method
+        """
+        self.credential_cache = get_credential_cache()
+
     def extract_base64_authorization_header(self,
                                             authorization_header: str) -> str:
         """
         Extract Base 64 Authorization Header
         """
 
-        if authorization_header is None:
-            return None
-
         if not isinstance(authorization_header, str):
             return None
 
-        if not authorization_header.startswith("Basic "):
+        if not authorization_header.startswith(BASIC_PREFIX):
             return None
 
-        encoded = authorization_header.split(' ', 1)[1]
-
-        return encoded
+        return authorization_header[len(BASIC_PREFIX):]
 
     def decode_base64_authorization_header(self,
                                            base64_authorization_header: str
@@ -38,20 +197,19 @@ class BasicAuth(Auth):
         """
         Decodes the value of a base64 string
         """
-        if base64_authorization_header is None:
-            return None
         if not isinstance(base64_authorization_header, str):
             return None
+        if not base64_authorization_header.isascii():
+            return None
 
+        decoded = decode_base64(base64_authorization_header)
+        if decoded is None:
+            return None
         try:
-            encoded = base64_authorization_header.encode('utf-8')
-            decoded64 = b64decode(encoded)
-            decoded = decoded64.decode('utf-8')
-        except BaseException:
+            return decoded.decode('utf-8')
+        except UnicodeDecodeError:
             return None
 
-        return decoded
-
     def extract_user_credentials(self,
                                  decoded_base64_authorization_header: str
                                  ) -> [str, str]:
@@ -105,21 +263,17 @@ class BasicAuth(Auth):
         if not auth_header:
             return None
 
-        encoded = self.extract_base64_authorization_header(auth_header)
-
-        if not encoded:
-            return None
-
-        decoded = self.decode_base64_authorization_header(encoded)
-
-        if not decoded:
-            return None
+        user = self.credential_cache.get(auth_header)
+        if user is not None:
+            return user
 
-        email, pwd = self.extract_user_credentials(decoded)
+        email, pwd = parse_basic_authorization(auth_header)
 
         if not email or not pwd:
             return None
 
         user = self.user_object_from_credentials(email, pwd)
+        if user is not None:
+            self.credential_cache.put(auth_header, user)
 
         return user
@@ -3,6 +3,7 @@
 Module of Session Authentication
 """
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import get_session_store
 from models.user import User
 import uuid
 
@@ -10,8 +11,9 @@ import uuid
 class SessionAuth(Auth):
     """
     Session Authentication Class
+    Sessions are kept in a bounded SessionStore shared by all instances
     """
-    user_id_by_session_id = {}
+    user_id_by_session_id = get_session_store()
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -68,9 +70,6 @@ class SessionAuth(Auth):
         if not user_id:
             return False
 
-        try:
-            del self.user_id_by_session_id[session_id]
-        except Exception:
-            pass
+        self.user_id_by_session_id.pop(session_id)
 
         return True
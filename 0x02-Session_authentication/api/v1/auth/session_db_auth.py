@@ -10,6 +10,11 @@ from models.user_session import UserSession
 class SessionDBAuth(SessionExpAuth):
     """
     Session in database Class
+    Sessions are resolved through the session backend, and saved as
+    UserSession objects as well: these only resolve the sessions an
+    in-process backend lost on a restart. With several worker
+    processes, use SESSION_BACKEND=sqlite, the UserSession file of
+    one worker can miss the sessions created by the others
     """
 
     def create_session(self, user_id=None):
@@ -23,8 +28,8 @@ class SessionDBAuth(SessionExpAuth):
 
         kwargs = {'user_id': user_id, 'session_id': session_id}
         user_session = UserSession(**kwargs)
+        UserSession.load_from_file()
         user_session.save()
-        UserSession.save_to_file()
 
         return session_id
 
@@ -35,6 +40,10 @@ class SessionDBAuth(SessionExpAuth):
         if session_id is None:
             return None
 
+        user_id = super().user_id_for_session_id(session_id)
+        if user_id is not None or self.user_id_by_session_id.shared:
+            return user_id
+
         UserSession.load_from_file()
         user_session = UserSession.search({
             'session_id': session_id
@@ -69,18 +78,16 @@ class SessionDBAuth(SessionExpAuth):
         if not user_id:
             return False
 
+        self.user_id_by_session_id.pop(session_id)
+
+        UserSession.load_from_file()
         user_session = UserSession.search({
             'session_id': session_id
         })
 
-        if not user_session:
-            return False
-
-        user_session = user_session[0]
-
         try:
-            user_session.remove()
-            UserSession.save_to_file()
+            for obj in user_session:
+                obj.remove()
         except Exception:
             return False
 
@@ -11,6 +11,8 @@ from os import getenv
 class SessionExpAuth(SessionAuth):
     """
     Session Expiration Class
+    Sessions are set in the store with session_duration as TTL,
+    so they are removed once expired instead of kept forever
     """
 
     def __init__(self):
@@ -41,7 +43,8 @@ class SessionExpAuth(SessionAuth):
             "created_at": datetime.now()
         }
 
-        self.user_id_by_session_id[session_id] = session_dictionary
+        self.user_id_by_session_id.set(session_id, session_dictionary,
+                                       self.session_duration)
 
         return session_id
 
@@ -53,9 +56,6 @@ class SessionExpAuth(SessionAuth):
         if session_id is None:
             return None
 
-        if session_id not in self.user_id_by_session_id.keys():
-            return None
-
         session_dictionary = self.user_id_by_session_id.get(session_id)
 
         if session_dictionary is None:
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Module of the Session store
+"""
+from collections import OrderedDict
+from datetime import datetime
+from os import getenv
+from typing import Any, List
+import heapq
+import json
+import sqlite3
+import threading
+import time
+
+
+MAX_SESSIONS = 100000
+SWEEP_INTERVAL = 10
+SESSION_SQLITE_PATH = ".db_sessions.sqlite3"
+USED_AT_RESOLUTION = 60
+
+
+class SessionStore():
+    """
+    Bounded session store: at most max_size sessions, the least
+    recently used evicted first
+    Sessions set with a ttl expire: a background thread pops them
+    from a heap of expiry times every sweep_interval seconds, so a
+    sweep costs O(expired) and not O(sessions)
+    Supports the dict operations SessionAuth used on its dict
+    Its public methods are the interface of the session backends;
+    shared is set by the backends shared by all the processes
+    """
+
+    shared = False
+
+    def __init__(self, max_size: int = MAX_SESSIONS,
+                 sweep_interval: float = SWEEP_INTERVAL):
+        """
+        Constructor Method
+        """
+        self.max_size = max_size
+        self.sweep_interval = sweep_interval
+        self.entries = OrderedDict()
+        self.expiries = []
+        self.lock = threading.Lock()
+        self.sweeper = None
+
+    def set(self, session_id: str, value: Any, ttl: float = None):
+        """
+        Store a session, expiring after ttl seconds if ttl is positive
+        """
+        expires_at = None
+        if ttl is not None and ttl > 0:
+            expires_at = time.monotonic() + ttl
+        with self.lock:
+            self.entries[session_id] = (value, expires_at)
+            self.entries.move_to_end(session_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            if expires_at is not None:
+                heapq.heappush(self.expiries, (expires_at, session_id))
+                self.start_sweeper()
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        """
+        Value of a session, default if unknown or expired
+        """
+        with self.lock:
+            entry = self.entries.get(session_id)
+            if entry is None:
+                return default
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del self.entries[session_id]
+                return default
+            self.entries.move_to_end(session_id)
+            return entry[0]
+
+    def pop(self, session_id: str, default: Any = None) -> Any:
+        """
+        Remove a session and return its value
+        """
+        with self.lock:
+            entry = self.entries.pop(session_id, None)
+        return default if entry is None else entry[0]
+
+    def sweep(self, now: float = None) -> int:
+        """
+        Remove the expired sessions, returns how many were removed
+        Heap entries of sessions replaced or removed meanwhile are
+        skipped, and dropped all at once when they outnumber sessions
+        """
+        if now is None:
+            now = time.monotonic()
+        removed = 0
+        with self.lock:
+            while self.expiries and self.expiries[0][0] <= now:
+                expires_at, session_id = heapq.heappop(self.expiries)
+                entry = self.entries.get(session_id)
+                if entry is not None and entry[1] == expires_at:
+                    del self.entries[session_id]
+                    removed += 1
+            if len(self.expiries) > 2 * len(self.entries) + 1024:
+                self.expiries = [(entry[1], session_id)
+                                 for session_id, entry in self.entries.items()
+                                 if entry[1] is not None]
+                heapq.heapify(self.expiries)
+        return removed
+
+    def start_sweeper(self):
+        """
+        Start the background sweeper thread once
+        """
+        if self.sweeper is None:
+            self.sweeper = threading.Thread(target=self.run, daemon=True)
+            self.sweeper.start()
+
+    def run(self):
+        """
+        Background loop sweeping once per sweep_interval
+        """
+        while True:
+            time.sleep(self.sweep_interval)
+            self.sweep()
+
+    def keys(self) -> List[str]:
+        """
+        Session IDs
+        """
+        with self.lock:
+            return list(self.entries.keys())
+
+    def __getitem__(self, session_id: str) -> Any:
+        """
+        Value of a session, KeyError if unknown or expired
+        """
+        missing = object()
+        value = self.get(session_id, missing)
+        if value is missing:
+            raise KeyError(session_id)
+        return value
+
+    def __setitem__(self, session_id: str, value: Any):
+        """
+        Store a session without expiry
+        """
+        self.set(session_id, value)
+
+    def __delitem__(self, session_id: str):
+        """
+        Remove a session, KeyError if unknown
+        """
+        with self.lock:
+            del self.entries[session_id]
+
+    def __contains__(self, session_id: str) -> bool:
+        """
+        Whether a session is stored and not expired
+        """
+        missing = object()
+        return self.get(session_id, missing) is not missing
+
+    def __len__(self) -> int:
+        """
+        Number of sessions stored
+        """
+        return len(self.entries)
+
+
+def encode_value(value: Any) -> str:
+    """
+    JSON of a session value, datetimes included
+    """
+    def default(obj):
+        if isinstance(obj, datetime):
+            return {"__datetime__": obj.isoformat()}
+        raise TypeError(repr(obj))
+    return json.dumps(value, default=default)
+
+
+def decode_value(value_json: str) -> Any:
+    """
+    Session value of its JSON
+    """
+    def object_hook(obj):
+        if len(obj) == 1 and "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        return obj
+    return json.loads(value_json, object_hook=object_hook)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store in a SQLite database file in WAL mode, shared by
+    all the processes using the same file (gunicorn workers), so a
+    session created by one process is known to the others
+    Sessions are looked up by their primary key; expiry times and
+    last uses (to USED_AT_RESOLUTION seconds) are indexed, so the
+    sweeper deletes the expired sessions and trims the store to
+    max_size with range queries
+    """
+
+    shared = True
+
+    def __init__(self, db_path: str = SESSION_SQLITE_PATH,
+                 max_size: int = MAX_SESSIONS,
+                 sweep_interval: float = SWEEP_INTERVAL):
+        """
+        Constructor Method
+        """
+        super().__init__(max_size, sweep_interval)
+        self.db_path = db_path
+        self.local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        Connection of the current thread
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(session_id TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL, used_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS "
+                               "sessions_expires_at ON sessions (expires_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS "
+                               "sessions_used_at ON sessions (used_at)")
+            self.local.connection = connection
+        return connection
+
+    def set(self, session_id: str, value: Any, ttl: float = None):
+        """
+        Store a session, expiring after ttl seconds if ttl is positive
+        """
+        now = time.time()
+        expires_at = now + ttl if ttl is not None and ttl > 0 else None
+        self.connection.execute(
+            "INSERT OR REPLACE INTO sessions "
+            "(session_id, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+            (session_id, encode_value(value), expires_at, now))
+        with self.lock:
+            self.start_sweeper()
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        """
+        Value of a session, default if unknown or expired
+        A lookup is a read: expired sessions are left to the sweeper,
+        and the last use is only written once it is older than
+        USED_AT_RESOLUTION seconds, so workers rarely contend for
+        the write lock
+        """
+        now = time.time()
+        row = self.connection.execute(
+            "SELECT value, expires_at, used_at FROM sessions "
+            "WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return default
+        if row[1] is not None and row[1] <= now:
+            return default
+        if row[2] < now - USED_AT_RESOLUTION:
+            self.connection.execute(
+                "UPDATE sessions SET used_at = ? WHERE session_id = ?",
+                (now, session_id))
+        return decode_value(row[0])
+
+    def pop(self, session_id: str, default: Any = None) -> Any:
+        """
+        Remove a session and return its value
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value FROM sessions WHERE session_id = ?",
+                (session_id,)).fetchone()
+            connection.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return default if row is None else decode_value(row[0])
+
+    def sweep(self, now: float = None) -> int:
+        """
+        Remove the expired sessions, returns how many were removed
+        The least recently used sessions beyond max_size are removed too
+        """
+        if now is None:
+            now = time.time()
+        removed = self.connection.execute(
+            "DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+        excess = len(self) - self.max_size
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM sessions WHERE session_id IN (SELECT session_id "
+                "FROM sessions ORDER BY used_at LIMIT ?)", (excess,))
+        return removed
+
+    def keys(self) -> List[str]:
+        """
+        Session IDs
+        """
+        return [row[0] for row in self.connection.execute(
+            "SELECT session_id FROM sessions "
+            "WHERE expires_at IS NULL OR expires_at > ?", (time.time(),))]
+
+    def __delitem__(self, session_id: str):
+        """
+        Remove a session, KeyError if unknown
+        """
+        if not self.connection.execute(
+                "DELETE FROM sessions WHERE session_id = ?",
+                (session_id,)).rowcount:
+            raise KeyError(session_id)
+
+    def __len__(self) -> int:
+        """
+        Number of sessions stored
+        """
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def get_session_store() -> SessionStore:
+    """
+    Session store selected by the SESSION_BACKEND environment variable:
+    "sqlite" for SQLiteSessionStore (database file SESSION_SQLITE_PATH),
+    the in-process SessionStore otherwise
+    Both hold at most SESSION_MAX_COUNT sessions
+    """
+    try:
+        max_size = int(getenv("SESSION_MAX_COUNT"))
+    except Exception:
+        max_size = MAX_SESSIONS
+    if getenv("SESSION_BACKEND") == "sqlite":
+        return SQLiteSessionStore(
+            getenv("SESSION_SQLITE_PATH", SESSION_SQLITE_PATH), max_size)
+    return SessionStore(max_size)
@@ -3,8 +3,35 @@
 Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, stream_with_context
+from flask.json import dumps
 from models.user import User
+from typing import Iterator
+
+
+def iter_users_json(users: list) -> Iterator[str]:
+    """
+    Yields the JSON list of users one user at a time, the same text
+    jsonify returns, without building the whole list first
+    The list layout is the one jsonify gives a list of two items, and
+    the users are dumped by the JSON settings of the app, so the text
+    follows the Flask version and the app configuration
+    """
+    head, separator, tail = jsonify([0, 0]).get_data(as_text=True).split("0")
+    if "\n" in head:
+        indent = head.rpartition("\n")[2]
+        options = {'indent': len(indent),
+                   'separators': (separator.partition("\n")[0], ": ")}
+    else:
+        indent = ""
+        options = {'separators': (separator, ":")}
+    empty = True
+    for user in users:
+        user_json = dumps(user.to_json(), **options)
+        yield (head if empty else separator) + \
+            user_json.replace("\n", "\n" + indent)
+        empty = False
+    yield jsonify([]).get_data(as_text=True) if empty else tail
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
@@ -14,8 +41,8 @@ def view_all_users() -> str:
     Return:
       - list of all User objects JSON represented
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    return Response(stream_with_context(iter_users_json(User.all())),
+                    mimetype='application/json')
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+""" Benchmark of the Basic Authorization header parsing
+"""
+import sys
+import time
+from base64 import b64decode, b64encode
+from api.v1.auth.basic_auth import parse_basic_authorization
+
+
+def legacy_parse(header: str) -> tuple:
+    """ Parsing as done before parse_basic_authorization
+    """
+    if header is None or not isinstance(header, str):
+        return None, None
+    if not header.startswith("Basic "):
+        return None, None
+    encoded = header.split(' ', 1)[1]
+    try:
+        decoded = b64decode(encoded.encode('utf-8')).decode('utf-8')
+    except BaseException:
+        return None, None
+    if ':' not in decoded:
+        return None, None
+    email, pwd = decoded.split(':', 1)
+    return email, pwd
+
+
+def headers() -> dict:
+    """ Valid and hostile headers by name
+    """
+    def basic(credentials: bytes) -> str:
+        return "Basic " + b64encode(credentials).decode()
+
+    return {
+        "valid": basic(b"bob@hbtn.io:H0lbertonSchool98!"),
+        "not basic": "Bearer " + "A" * 40,
+        "bad padding": "Basic " + "QWxhZGRpbjpvcGVuIHNlc2FtZQ",
+        "no colon": basic(b"bob@hbtn.io"),
+        "bad utf-8": basic(b"\xff\xfe:\xff"),
+        "oversized": basic(b"bob@hbtn.io:" + b"x" * 1000000),
+    }
+
+
+def timed(func, header: str, count: int) -> float:
+    """ Microseconds per call of func on header
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        func(header)
+    return (time.perf_counter() - start) * 1e6 / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, header in headers().items():
+        runs = count if len(header) < 1000 else max(count // 1000, 1)
+        print("{}: {:.2f} us before, {:.2f} us after".format(
+            name, timed(legacy_parse, header, runs),
+            timed(parse_basic_authorization, header, runs)))
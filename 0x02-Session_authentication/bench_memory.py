@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+""" Memory benchmark of User and UserSession objects
+"""
+import sys
+import tracemalloc
+from datetime import datetime
+from models.user import User
+from models.user_session import UserSession
+
+
+class DictUser():
+    """ User laid out with a __dict__, as before __slots__
+    """
+
+    def __init__(self, **kwargs):
+        self.id = kwargs['id']
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+class DictUserSession():
+    """ UserSession laid out with a __dict__, as before __slots__
+    """
+
+    def __init__(self, **kwargs):
+        self.id = kwargs['id']
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
+
+
+def bytes_per_object(cls, count: int) -> float:
+    """ Bytes allocated per instance of cls, over count instances
+    """
+    kwargs = [{'id': str(i), 'email': 'user{}@hbtn.io'.format(i),
+               'user_id': str(i), 'session_id': str(i)}
+              for i in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [cls(**kw) for kw in kwargs]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return (after - before) / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for before, after in ((DictUser, User), (DictUserSession, UserSession)):
+        print("{}: {:.0f} bytes/object before, {:.0f} after".format(
+            after.__name__, bytes_per_object(before, count),
+            bytes_per_object(after, count)))
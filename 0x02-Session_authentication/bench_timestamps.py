@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+""" Benchmark of the Base timestamp codec against strptime/strftime
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+from models.base import TIMESTAMP_FORMAT, format_timestamp, parse_timestamp
+
+
+def timestamps(count: int) -> list:
+    """ count datetimes spread over a few years, at second precision
+    """
+    start = datetime(2017, 1, 1)
+    return [start + timedelta(seconds=i * 7919) for i in range(count)]
+
+
+def timed(label: str, func, values: list) -> list:
+    """ Apply func to every value and print the elapsed time
+    """
+    start = time.perf_counter()
+    results = [func(value) for value in values]
+    elapsed = time.perf_counter() - start
+    print("{}: {:.3f}s ({:.0f} ns/op)".format(
+        label, elapsed, elapsed * 1e9 / len(values)))
+    return results
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    values = timestamps(count)
+    before = timed("strftime", lambda v: v.strftime(TIMESTAMP_FORMAT), values)
+    after = timed("format_timestamp", format_timestamp, values)
+    assert before == after
+    parsed = timed("strptime",
+                   lambda v: datetime.strptime(v, TIMESTAMP_FORMAT), after)
+    assert timed("parse_timestamp", parse_timestamp, after) == parsed
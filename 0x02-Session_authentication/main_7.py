@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+""" Main 7
+Switching an existing JSON store to STORAGE_TYPE=log keeps its objects
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def run(code: str, storage_type: str = None) -> str:
+    """ Run code in a new process, as a restarted API would
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop("STORAGE_TYPE", None)
+    if storage_type is not None:
+        env["STORAGE_TYPE"] = storage_type
+    return subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                          stdout=subprocess.PIPE,
+                          universal_newlines=True).stdout.strip()
+
+
+with tempfile.TemporaryDirectory() as directory:
+    os.chdir(directory)
+    run("from models.user import User\n"
+        "for i in range(3):\n"
+        "    User(email='bob{}@hbtn.io'.format(i)).save()")
+    print("JSON store: {} users".format(run(
+        "from models.user import User\n"
+        "User.load_from_file()\n"
+        "print(User.count())")))
+
+    print("Log store after one save: {} users".format(run(
+        "from models.user import User\n"
+        "User.load_from_file()\n"
+        "user = User.search({'email': 'bob0@hbtn.io'})[0]\n"
+        "user.first_name = 'Bob'\n"
+        "user.save()\n"
+        "print(User.count())", "log")))
+
+    print("Log store after restart: {} users".format(run(
+        "from models.user import User\n"
+        "User.load_from_file()\n"
+        "print(User.count())", "log")))
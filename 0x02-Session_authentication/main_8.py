@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+""" Main 8
+Sessions of the SQLite session backend created in one process are
+resolved in another one, until they expire, with SessionExpAuth and
+with SessionDBAuth, even after a login in a worker started earlier
+"""
+import multiprocessing
+import os
+import tempfile
+import time
+
+SESSION_DURATION = 2
+
+
+def get_auth(auth_name: str):
+    """ Session authentication of the class auth_name
+    """
+    from api.v1.auth.session_db_auth import SessionDBAuth
+    from api.v1.auth.session_exp_auth import SessionExpAuth
+    return {"SessionExpAuth": SessionExpAuth,
+            "SessionDBAuth": SessionDBAuth}[auth_name]()
+
+
+def create_sessions(count: int, auth_name: str,
+                    results: multiprocessing.Queue):
+    """ Create count sessions in this process
+    """
+    auth = get_auth(auth_name)
+    results.put([auth.create_session("user{}".format(i))
+                 for i in range(count)])
+
+
+def resolve_sessions(session_ids: list, auth_name: str,
+                     results: multiprocessing.Queue):
+    """ Resolve session_ids in this process, and count the writes
+    the lookups made to the database
+    """
+    auth = get_auth(auth_name)
+    store = auth.user_id_by_session_id
+    user_ids = [auth.user_id_for_session_id(session_id)
+                for session_id in session_ids]
+    before = store.connection.total_changes
+    for session_id in session_ids:
+        auth.user_id_for_session_id(session_id)
+    results.put((user_ids, store.connection.total_changes - before))
+
+
+def early_worker(logins: multiprocessing.Queue,
+                 results: multiprocessing.Queue):
+    """ Worker looking a session up before the other workers create
+    theirs, then logging a user in once told to
+    """
+    auth = get_auth("SessionDBAuth")
+    auth.user_id_for_session_id("unknown")
+    results.put(None)
+    logins.get()
+    results.put(auth.create_session("late"))
+
+
+def in_process(target, *args):
+    """ Run target in a new process and return what it put in its queue
+    """
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=args + (results,))
+    process.start()
+    result = results.get(timeout=60)
+    process.join()
+    return result
+
+
+def resolved(user_ids: list) -> int:
+    """ Number of sessions resolved to their user
+    """
+    return sum(user_id == "user{}".format(i)
+               for i, user_id in enumerate(user_ids))
+
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        os.environ["SESSION_BACKEND"] = "sqlite"
+        os.environ["SESSION_SQLITE_PATH"] = os.path.join(directory,
+                                                         "sessions.sqlite3")
+        os.environ["SESSION_DURATION"] = str(SESSION_DURATION)
+
+        session_ids = in_process(create_sessions, 100, "SessionExpAuth")
+        user_ids, writes = in_process(resolve_sessions, session_ids,
+                                      "SessionExpAuth")
+        print("Resolved in another process: {}/{}".format(
+            resolved(user_ids), len(session_ids)))
+        print("Writes made by repeated lookups: {}".format(writes))
+
+        logins, results = multiprocessing.Queue(), multiprocessing.Queue()
+        worker = multiprocessing.Process(target=early_worker,
+                                         args=(logins, results))
+        worker.start()
+        results.get(timeout=60)
+        db_session_ids = in_process(create_sessions, 100, "SessionDBAuth")
+        logins.put(None)
+        late = results.get(timeout=60)
+        worker.join()
+        user_ids, _ = in_process(resolve_sessions, db_session_ids + [late],
+                                 "SessionDBAuth")
+        print("SessionDBAuth, resolved after a login in an earlier "
+              "worker: {}/{}".format(resolved(user_ids[:-1]) +
+                                     (user_ids[-1] == "late"),
+                                     len(db_session_ids) + 1))
+
+        time.sleep(SESSION_DURATION + 0.5)
+        for auth_name, ids in (("SessionExpAuth", session_ids),
+                               ("SessionDBAuth", db_session_ids)):
+            user_ids, _ = in_process(resolve_sessions, ids, auth_name)
+            print("{}, resolved after expiry: {}".format(
+                auth_name, sum(user_id is not None for user_id in user_ids)))
+        os.chdir("/")
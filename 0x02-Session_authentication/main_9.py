@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+""" Main 9
+Stress test of the storage writes: a writer process saving users is
+killed at random points, and the store must always load afterwards,
+without the temporary files of the killed writes
+A save made after a torn log line must survive a restart
+"""
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+WRITER = """
+from models.user import User
+User.load_from_file()
+i = 0
+while True:
+    User(email='bob{}@hbtn.io'.format(i), first_name='x' * 200).save()
+    i += 1
+"""
+LOADER = """
+from models.user import User
+User.load_from_file()
+print(User.count())
+"""
+
+
+def run(code: str, env: dict, **kwargs) -> subprocess.Popen:
+    """ Start code in a new process
+    """
+    return subprocess.Popen([sys.executable, "-c", code], env=env, **kwargs)
+
+
+def stress(storage_type: str, kills: int) -> list:
+    """ Kill the writer kills times, returns the user counts loaded
+    after each kill
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT, STORAGE_TYPE=storage_type,
+               STORAGE_FSYNC="always")
+    counts = []
+    for _ in range(kills):
+        writer = run(WRITER, env)
+        time.sleep(random.uniform(0.5, 1.5))
+        writer.send_signal(signal.SIGKILL)
+        writer.wait()
+        if storage_type == "file" and os.path.exists(".db_User.json"):
+            with open(".db_User.json") as f:
+                json.load(f)
+        loader = run(LOADER, env, stdout=subprocess.PIPE,
+                     universal_newlines=True)
+        output, _ = loader.communicate()
+        if loader.returncode != 0:
+            raise RuntimeError("store not loadable after kill")
+        leftovers = [name for name in os.listdir(".")
+                     if name.endswith(".tmp")]
+        if leftovers:
+            raise RuntimeError("temporary files left after a load: {}"
+                               .format(leftovers))
+        counts.append(int(output))
+    return counts
+
+
+def torn_line() -> int:
+    """ Save a user after a record torn by a crash, returns the user
+    count loaded after a restart
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT, STORAGE_TYPE="log")
+    subprocess.run([sys.executable, "-c",
+                    "from models.user import User\n"
+                    "for i in range(3):\n"
+                    "    User(email='bob{}@hbtn.io'.format(i)).save()"],
+                   env=env, check=True)
+    with open(".db_User.log", "a") as f:
+        f.write('{"id": "torn", "obj": {"email": "to')
+    subprocess.run([sys.executable, "-c",
+                    "from models.user import User\n"
+                    "User.load_from_file()\n"
+                    "User(email='after-crash@hbtn.io').save()"],
+                   env=env, check=True)
+    loader = run(LOADER, env, stdout=subprocess.PIPE, universal_newlines=True)
+    return int(loader.communicate()[0])
+
+
+if __name__ == "__main__":
+    kills = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for storage_type in ("file", "log"):
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            counts = stress(storage_type, kills)
+            print("{}: {} kills, store always loaded, users {}".format(
+                storage_type, kills, counts))
+            print("{}: no user lost: {}".format(
+                storage_type, counts == sorted(counts)))
+        os.chdir(ROOT)
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        print("log: users after a save following a torn line: {}/4".format(
+            torn_line()))
+        os.chdir(ROOT)
@@ -3,21 +3,173 @@
 Base module
 """
 from datetime import datetime
+from os import getenv
 from typing import TypeVar, List, Iterable
-from os import path
-import json
+from models.storage import get_storage
+import atexit
+import logging
+import threading
+import time
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+STORAGE = get_storage()
+INDEXES = {}
+INDEXED_VALUES = {}
+SLOTS = {}
+WRITE_MAX_PENDING = 1000
+LAZY_LOAD = getenv("STORAGE_LAZY_LOAD") == "1"
+
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    Parse a TIMESTAMP_FORMAT string
+    Strings with the fixed YYYY-MM-DDTHH:MM:SS layout go through
+    datetime.fromisoformat, anything else through strptime
+    """
+    if (len(value) == 19 and value[4] == '-' and value[7] == '-' and
+            value[10] == 'T' and value[13] == ':' and value[16] == ':'):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def format_timestamp(value: datetime) -> str:
+    """
+    Format a datetime as TIMESTAMP_FORMAT
+    Naive datetimes from year 1000 on go through datetime.isoformat,
+    which gives the same string as strftime without its overhead
+    """
+    if value.tzinfo is None and value.year >= 1000:
+        return value.isoformat('T', 'seconds')
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+class WriteCoalescer():
+    """
+    Group commit of saves and removals: changed classes are marked
+    dirty and saved to file by a background thread once per window
+    seconds, or as soon as max_pending changes are waiting
+    A failed save is logged and its class stays dirty, so it is
+    retried on the next window
+    """
+
+    def __init__(self, window: float, max_pending: int = WRITE_MAX_PENDING):
+        """
+        Constructor Method
+        """
+        self.window = window
+        self.max_pending = max_pending
+        self.dirty = {}
+        self.changes = {}
+        self.pending = 0
+        self.condition = threading.Condition()
+        self.flush_lock = threading.Lock()
+        threading.Thread(target=self.run, daemon=True).start()
+        atexit.register(self.flush)
+
+    def mark(self, cls, changes: int = 1):
+        """
+        Mark a class as changed
+        """
+        with self.condition:
+            s_class = cls.__name__
+            self.dirty[s_class] = cls
+            self.changes[s_class] = self.changes.get(s_class, 0) + changes
+            self.pending += changes
+            if self.pending == changes or self.pending >= self.max_pending:
+                self.condition.notify()
+
+    def flush(self, cls=None):
+        """
+        Save the dirty classes to file now, or only cls if given
+        Classes that failed to save are marked dirty again
+        and the first error is raised
+        """
+        with self.flush_lock:
+            with self.condition:
+                if cls is None:
+                    names = list(self.dirty.keys())
+                elif cls.__name__ in self.dirty:
+                    names = [cls.__name__]
+                else:
+                    names = []
+                dirty = [(self.dirty.pop(name), self.changes.pop(name, 0))
+                         for name in names]
+                self.pending -= sum(changes for _, changes in dirty)
+            error = None
+            for dirty_cls, changes in dirty:
+                s_class = dirty_cls.__name__
+                try:
+                    STORAGE.save_all(s_class, dict(DATA[s_class]))
+                except Exception as e:
+                    self.mark(dirty_cls, changes)
+                    error = error or e
+            if error is not None:
+                raise error
+
+    def run(self):
+        """
+        Background loop flushing once per window
+        """
+        while True:
+            with self.condition:
+                while not self.dirty:
+                    self.condition.wait()
+                self.condition.wait_for(
+                    lambda: self.pending >= self.max_pending, self.window)
+            try:
+                self.flush()
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    "Coalesced write failed, retrying in %ss", self.window)
+                time.sleep(self.window)
+
+
+def get_coalescer() -> WriteCoalescer:
+    """
+    Write coalescer enabled by the STORAGE_WRITE_WINDOW_MS environment
+    variable (window in milliseconds), with STORAGE_WRITE_MAX_PENDING
+    changes flushing early; None when writes are not coalesced.
+    Writes to a shared storage are never coalesced
+    """
+    if STORAGE.shared:
+        return None
+    try:
+        window_ms = float(getenv("STORAGE_WRITE_WINDOW_MS"))
+    except Exception:
+        return None
+    if window_ms <= 0:
+        return None
+
+    try:
+        max_pending = int(getenv("STORAGE_WRITE_MAX_PENDING"))
+    except Exception:
+        max_pending = WRITE_MAX_PENDING
+    return WriteCoalescer(window_ms / 1000, max_pending)
+
+
+COALESCER = get_coalescer()
 
 
 class Base():
     """
     Base class
+    Subclasses list in INDEXED_ATTRIBUTES the attributes to keep
+    a hash index on: search on these attributes doesn't scan all objects
+    With a shared storage (SQLiteStorage), objects are not kept in DATA:
+    every method goes to the storage
+    Attributes are declared in __slots__ so instances carry no __dict__
     """
 
+    __slots__ = ('id', 'created_at', 'updated_at')
+
+    INDEXED_ATTRIBUTES = ()
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a Base instance
@@ -28,13 +180,11 @@ class Base():
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -53,30 +203,71 @@ class Base():
         Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        items = [(key, getattr(self, key)) for key in self._slots()
+                 if hasattr(self, key)]
+        items.extend(getattr(self, '__dict__', {}).items())
+        for key, value in items:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+                result[key] = format_timestamp(value)
             else:
                 result[key] = value
         return result
 
+    @classmethod
+    def _slots(cls) -> tuple:
+        """
+        Names of the slot attributes, base classes first
+        """
+        slots = SLOTS.get(cls)
+        if slots is None:
+            slots = tuple(name for klass in reversed(cls.__mro__)
+                          for name in klass.__dict__.get('__slots__', ()))
+            SLOTS[cls] = slots
+        return slots
+
     @classmethod
     def load_from_file(cls):
         """
         Load all objects from file
+        Pending coalesced writes of the class are flushed first.
+        Nothing is read when the file didn't change since the previous
+        load, and only the new records are read from a log
+        With STORAGE_LAZY_LOAD=1, DATA keeps the JSON dictionaries and
+        objects are built on first access by get or search
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        cls.flush()
+        changes = STORAGE.reload(s_class, s_class not in DATA)
+        if changes is None:
             return
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        full, objs_json = changes
+        if full:
+            DATA[s_class] = {}
+            INDEXES[s_class] = {}
+            INDEXED_VALUES[s_class] = {}
+        for obj_id, obj_json in objs_json.items():
+            if obj_json is None:
+                if DATA[s_class].pop(obj_id, None) is not None:
+                    cls._unindex(obj_id)
+                continue
+            obj = obj_json if LAZY_LOAD else cls(**obj_json)
+            DATA[s_class][obj_id] = obj
+            cls._index(obj_id, obj)
+
+    @classmethod
+    def _materialize(cls, obj_id: str, obj):
+        """
+        Return the object stored under obj_id, built from its
+        JSON dictionary and cached in DATA if not built yet
+        """
+        if type(obj) is dict:
+            obj = cls(**obj)
+            DATA[cls.__name__][obj_id] = obj
+            cls._index(obj_id, obj)
+        return obj
 
     @classmethod
     def save_to_file(cls):
@@ -84,13 +275,17 @@ class Base():
         Save all objects to file
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        if STORAGE.shared:
+            return
+        STORAGE.save_all(s_class, dict(DATA[s_class]))
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def flush(cls):
+        """
+        Write the coalesced changes of the class to file now
+        """
+        if COALESCER is not None:
+            COALESCER.flush(cls)
 
     def save(self):
         """
@@ -98,24 +293,96 @@ class Base():
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
+        if STORAGE.shared:
+            STORAGE.save(s_class, None, self)
+            return
         DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self._index(self.id, self)
+        if COALESCER is not None:
+            COALESCER.mark(self.__class__)
+        else:
+            STORAGE.save(s_class, DATA[s_class], self)
 
     def remove(self):
         """
         Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
+        if STORAGE.shared:
+            STORAGE.remove(s_class, None, self.id)
+        elif DATA[s_class].get(self.id) is not None:
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            self._unindex(self.id)
+            if COALESCER is not None:
+                COALESCER.mark(self.__class__)
+            else:
+                STORAGE.remove(s_class, DATA[s_class], self.id)
+
+    @classmethod
+    def _index(cls, obj_id: str, obj):
+        """
+        Index an object, or its JSON dictionary,
+        under its indexed attribute values
+        """
+        s_class = cls.__name__
+        cls._unindex(obj_id)
+        indexes = INDEXES.setdefault(s_class, {})
+        indexed = {}
+        for attribute in cls.INDEXED_ATTRIBUTES:
+            value = cls._index_value(obj, attribute)
+            try:
+                objs = indexes.setdefault(attribute, {}).setdefault(value, {})
+            except TypeError:
+                continue
+            objs[obj_id] = obj
+            indexed[attribute] = value
+        INDEXED_VALUES.setdefault(s_class, {})[obj_id] = indexed
+
+    @classmethod
+    def _index_value(cls, obj, attribute: str):
+        """
+        Value of an indexed attribute of an object or of its JSON
+        dictionary; subclasses override it for derived attributes
+        """
+        if type(obj) is dict:
+            return obj.get(attribute)
+        return getattr(obj, attribute, None)
+
+    @classmethod
+    def _unindex(cls, obj_id: str):
+        """
+        Remove an object from the indexes
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.get(s_class, {})
+        indexed = INDEXED_VALUES.get(s_class, {}).pop(obj_id, {})
+        for attribute, value in indexed.items():
+            objs = indexes[attribute][value]
+            objs.pop(obj_id, None)
+            if not objs:
+                del indexes[attribute][value]
 
     @classmethod
-    def count(cls) -> int:
+    def count(cls, attributes: dict = {}) -> int:
         """
-        Count all objects
+        Count all objects, or the objects with matching attributes
+        Counting on one indexed attribute reads the index
+        and builds no object
         """
         s_class = cls.__name__
+        if any(k not in cls.INDEXED_ATTRIBUTES for k in attributes):
+            return len(cls.search(attributes))
+        if STORAGE.shared:
+            return STORAGE.count(s_class, cls.INDEXED_ATTRIBUTES,
+                                 attributes, cls._index_value)
+        if len(attributes) == 1:
+            (k, v), = attributes.items()
+            try:
+                return len(INDEXES.get(s_class, {}).get(k, {}).get(v, {}))
+            except TypeError:
+                pass
+        if attributes:
+            return len(cls.search(attributes))
         return len(DATA[s_class].keys())
 
     @classmethod
@@ -131,7 +398,30 @@ class Base():
         Return one object by ID
         """
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        if STORAGE.shared:
+            obj_json = STORAGE.get(s_class, id)
+            return cls(**obj_json) if obj_json is not None else None
+        obj = DATA[s_class].get(id)
+        return cls._materialize(id, obj) if obj is not None else None
+
+    @classmethod
+    def _candidates(cls, attributes: dict) -> list:
+        """
+        (ID, object) pairs that may match attributes: the index entry
+        of the first indexed attribute, or all objects
+        """
+        s_class = cls.__name__
+        objs = DATA[s_class].items()
+        indexes = INDEXES.get(s_class, {})
+        for k, v in attributes.items():
+            if k not in cls.INDEXED_ATTRIBUTES:
+                continue
+            try:
+                objs = indexes.get(k, {}).get(v, {}).items()
+            except TypeError:
+                continue
+            break
+        return list(objs)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
@@ -139,6 +429,13 @@ class Base():
         Search all objects with matching attributes
         """
         s_class = cls.__name__
+        if STORAGE.shared:
+            objs = [cls(**obj_json) for obj_json in STORAGE.search(
+                s_class, cls.INDEXED_ATTRIBUTES, attributes,
+                cls._index_value)]
+        else:
+            objs = [cls._materialize(obj_id, obj)
+                    for obj_id, obj in cls._candidates(attributes)]
 
         def _search(obj):
             if len(attributes) == 0:
@@ -148,4 +445,4 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        return list(filter(_search, objs))
@@ -0,0 +1,685 @@
+#!/usr/bin/env python3
+"""
+Storage engines module
+"""
+from os import getenv, path
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+import atexit
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+LOG_COMPACT_SIZE = 1024 * 1024
+FSYNC_INTERVAL_MS = 100
+SQLITE_PATH = ".db.sqlite3"
+
+
+def serialize(obj) -> dict:
+    """
+    JSON dictionary of an object, or the object itself when it is
+    still a JSON dictionary (lazy loading)
+    """
+    return obj if type(obj) is dict else obj.to_json(True)
+
+
+def iter_json(objs: dict) -> Iterator[str]:
+    """
+    Yields the JSON text of objs one object at a time, the same text
+    json.dump writes, without building the whole dictionary first
+    """
+    separator = "{"
+    for obj_id, obj in objs.items():
+        yield "{}{}: {}".format(separator, json.dumps(obj_id),
+                                json.dumps(serialize(obj)))
+        separator = ", "
+    yield "{}" if separator == "{" else "}"
+
+
+class Durability():
+    """
+    fsync policy of the storage files:
+    "none" leaves flushing to the OS, "always" fsyncs each write
+    before it is visible, "batch" fsyncs the written files
+    in the background at most interval_ms after the write
+    """
+
+    def __init__(self, mode: str = "none",
+                 interval_ms: float = FSYNC_INTERVAL_MS):
+        """
+        Constructor Method
+        """
+        if mode not in ("none", "always", "batch"):
+            raise ValueError("Unknown fsync mode: {}".format(mode))
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.pending = set()
+        self.condition = threading.Condition()
+        if mode == "batch":
+            threading.Thread(target=self.run, daemon=True).start()
+            atexit.register(self.flush)
+
+    def sync_file(self, f: TextIO):
+        """
+        Called on a written file before it is closed
+        """
+        if self.mode == "always":
+            f.flush()
+            os.fsync(f.fileno())
+
+    def sync_path(self, file_path: str, renamed: bool = False):
+        """
+        Called once a written file is closed, and renamed into place
+        when renamed is set
+        """
+        if self.mode == "always" and renamed:
+            self.fsync(path.dirname(path.abspath(file_path)))
+        elif self.mode == "batch":
+            with self.condition:
+                self.pending.add(file_path)
+                self.condition.notify()
+
+    @staticmethod
+    def fsync(file_path: str):
+        """
+        fsync a file or a directory by path
+        """
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def flush(self):
+        """
+        fsync the files written since the last batch
+        """
+        with self.condition:
+            pending, self.pending = self.pending, set()
+        for file_path in pending:
+            try:
+                self.fsync(file_path)
+                self.fsync(path.dirname(path.abspath(file_path)))
+            except OSError:
+                pass
+
+    def run(self):
+        """
+        Background loop of the batch mode
+        """
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+            time.sleep(self.interval)
+            self.flush()
+
+
+class FileStorage():
+    """
+    Stores each class as one JSON file, rewritten on every change.
+    Files are written to a temporary file renamed over the previous
+    one, so readers and crashes only ever see a complete file.
+    Temporary files are named after the writer process ID, and those
+    of dead writers are deleted on the first load of their class
+    """
+
+    shared = False
+
+    def __init__(self, durability: Durability = None):
+        """
+        Constructor Method
+        """
+        self.durability = durability or Durability()
+        self.signatures = {}
+
+    def file_path(self, s_class: str) -> str:
+        """
+        Path of the JSON file of a class
+        """
+        return ".db_{}.json".format(s_class)
+
+    def load(self, s_class: str) -> Dict[str, dict]:
+        """
+        Return the JSON dictionaries of all stored objects by ID
+        """
+        return self.reload(s_class, True)[1]
+
+    def reload(self, s_class: str, full: bool = False
+               ) -> Optional[Tuple[bool, Dict[str, dict]]]:
+        """
+        Return the changes since the previous reload of the class:
+        None when the file has the same inode, size and mtime,
+        otherwise (True, JSON dictionaries of all objects by ID).
+        full forces a read
+        """
+        file_path = self.file_path(s_class)
+        if full:
+            self.clean_tmp(file_path)
+        try:
+            f = open(file_path, 'r')
+        except FileNotFoundError:
+            if not full and file_path in self.signatures \
+                    and self.signatures[file_path] is None:
+                return None
+            self.signatures[file_path] = None
+            return True, {}
+
+        with f:
+            signature = FileStorage.signature(os.fstat(f.fileno()))
+            if not full and self.signatures.get(file_path) == signature:
+                return None
+            objs_json = json.load(f)
+        self.signatures[file_path] = signature
+        return True, objs_json
+
+    @staticmethod
+    def signature(stat: os.stat_result) -> tuple:
+        """
+        Signature of a file telling whether it changed since a reload
+        """
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def save_all(self, s_class: str, objs: dict):
+        """
+        Store all objects, serialized one at a time
+        """
+        f = self.open_tmp(self.file_path(s_class))
+        try:
+            f.writelines(iter_json(objs))
+            self.commit(f, self.file_path(s_class))
+        finally:
+            self.discard(f)
+
+    def open_tmp(self, file_path: str) -> TextIO:
+        """
+        Open a temporary file to be renamed to file_path by commit
+        """
+        directory, name = path.split(path.abspath(file_path))
+        return tempfile.NamedTemporaryFile(
+            'w', dir=directory, prefix="{}.{}.".format(name, os.getpid()),
+            suffix=".tmp", delete=False)
+
+    def clean_tmp(self, file_path: str):
+        """
+        Delete the temporary files of file_path left by writers
+        killed before their rename: those of dead processes
+        """
+        directory, name = path.split(path.abspath(file_path))
+        prefix = name + "."
+        for entry in os.listdir(directory):
+            if not entry.startswith(prefix) or not entry.endswith(".tmp"):
+                continue
+            pid = entry[len(prefix):].split(".")[0]
+            if pid.isdigit() and self.is_running(int(pid)):
+                continue
+            try:
+                os.remove(path.join(directory, entry))
+            except OSError:
+                pass
+
+    @staticmethod
+    def is_running(pid: int) -> bool:
+        """
+        Whether the process pid is running, or may be
+        """
+        if pid == os.getpid() or os.name != "posix":
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def commit(self, f: TextIO, file_path: str):
+        """
+        Atomically replace file_path by the temporary file f
+        The file holds the objects of this process, so its signature
+        is recorded: the next reload doesn't read it again
+        """
+        self.durability.sync_file(f)
+        f.flush()
+        stat = os.fstat(f.fileno())
+        f.close()
+        os.replace(f.name, file_path)
+        self.signatures[file_path] = self.signature(stat)
+        self.durability.sync_path(file_path, renamed=True)
+
+    @staticmethod
+    def discard(f: TextIO):
+        """
+        Close and delete the temporary file f unless it was committed
+        """
+        f.close()
+        if path.exists(f.name):
+            os.remove(f.name)
+
+    def save(self, s_class: str, objs: dict, obj):
+        """
+        Store a new or updated object
+        """
+        self.save_all(s_class, dict(objs))
+
+    def remove(self, s_class: str, objs: dict, obj_id: str):
+        """
+        Store the removal of an object
+        """
+        self.save_all(s_class, dict(objs))
+
+
+class LogStorage(FileStorage):
+    """
+    Stores each class as an append-only log of JSON lines:
+    a save appends the object, a removal appends its ID.
+    The log is replayed on load and compacted in the background
+    to one line per object once it grows past compact_size bytes
+    and twice its size after the previous compaction
+    """
+
+    def __init__(self, compact_size: int = LOG_COMPACT_SIZE,
+                 durability: Durability = None):
+        """
+        Constructor Method
+        """
+        super().__init__(durability)
+        self.compact_size = compact_size
+        self.locks = {}
+        self.compacting = {}
+        self.compacted_size = {}
+
+    def log_path(self, s_class: str) -> str:
+        """
+        Path of the log file of a class
+        """
+        return ".db_{}.log".format(s_class)
+
+    def lock(self, s_class: str) -> threading.Lock:
+        """
+        Lock serializing the writes to the log of a class
+        """
+        return self.locks.setdefault(s_class, threading.Lock())
+
+    def reload(self, s_class: str, full: bool = False
+               ) -> Optional[Tuple[bool, Dict[str, dict]]]:
+        """
+        Replay the log, starting from the JSON file of FileStorage
+        when there is no log yet.
+        When the log is the one of the previous reload (same inode),
+        only the lines appended since are replayed and returned as
+        (False, JSON dictionaries by ID, None for removed objects)
+        """
+        log_path = self.log_path(s_class)
+        if full:
+            self.clean_tmp(log_path)
+        try:
+            f = open(log_path, 'rb')
+        except FileNotFoundError:
+            return super().reload(s_class, full)
+
+        with f:
+            stat = os.fstat(f.fileno())
+            known = self.signatures.get(log_path)
+            tail = not full and known is not None \
+                and known[0] == stat.st_ino and known[1] <= stat.st_size
+            if tail and known[1] == stat.st_size:
+                return None
+            if tail:
+                f.seek(known[1])
+
+            objs_json = {}
+            offset = f.tell()
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # append in progress, read again on the next reload
+                    break
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # torn line of an interrupted append
+                    continue
+                self.apply(objs_json, record)
+        self.signatures[log_path] = (stat.st_ino, offset)
+
+        if tail:
+            return False, objs_json
+        return True, {obj_id: obj_json
+                      for obj_id, obj_json in objs_json.items()
+                      if obj_json is not None}
+
+    @staticmethod
+    def signature(stat: os.stat_result) -> tuple:
+        """
+        Signature of a log: its inode and the offset replayed up to
+        """
+        return stat.st_ino, stat.st_size
+
+    @staticmethod
+    def apply(objs_json: Dict[str, dict], record: dict):
+        """
+        Apply one log record to JSON dictionaries by ID
+        """
+        if record.get('removed'):
+            objs_json[record['id']] = None
+        else:
+            objs_json[record['id']] = record['obj']
+
+    def append(self, s_class: str, objs: dict, record: dict):
+        """
+        Append a record to the log, and start a compaction
+        if the log is past compact_size
+        Without a log yet, the log is first written from objs, which
+        already hold the record: the objects loaded from the JSON file
+        of FileStorage are kept when switching to LogStorage
+        A log not ending with a newline has a torn last line of an
+        interrupted append: the record starts on a new line, so the
+        torn line alone is skipped on replay
+        When the log was replayed up to its end and no other process
+        appended meanwhile, the replayed offset moves past the record
+        """
+        line = json.dumps(record) + "\n"
+        if not path.exists(self.log_path(s_class)) \
+                and self.seed(s_class, dict(objs)):
+            return
+        with self.lock(s_class):
+            with open(self.log_path(s_class), 'ab+') as f:
+                data = line.encode()
+                start = f.seek(0, os.SEEK_END)
+                if start > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data
+                f.write(data)
+                f.flush()
+                stat = os.fstat(f.fileno())
+                size = stat.st_size
+                if size == start + len(data) and \
+                        self.signatures.get(self.log_path(s_class)) == \
+                        (stat.st_ino, start):
+                    self.signatures[self.log_path(s_class)] = \
+                        self.signature(stat)
+                self.durability.sync_file(f)
+            self.durability.sync_path(self.log_path(s_class))
+            pending = self.compacting.get(s_class)
+            if pending is not None:
+                pending.append(line)
+            elif size > max(self.compact_size,
+                            2 * self.compacted_size.get(s_class, 0)):
+                self.compacting[s_class] = []
+                threading.Thread(target=self.compact,
+                                 args=(s_class, dict(objs)),
+                                 daemon=True).start()
+
+    def seed(self, s_class: str, objs: dict) -> bool:
+        """
+        Write the first log from all objects, returns False
+        when another thread wrote it meanwhile
+        """
+        f = self.open_tmp(self.log_path(s_class))
+        try:
+            with self.lock(s_class):
+                if path.exists(self.log_path(s_class)):
+                    return False
+                self.write(f, objs)
+                self.compacted_size[s_class] = f.tell()
+                self.commit(f, self.log_path(s_class))
+                return True
+        finally:
+            self.discard(f)
+
+    @staticmethod
+    def write(f: TextIO, objs: dict):
+        """
+        Write one log line per object of objs
+        """
+        for obj_id, obj in objs.items():
+            f.write(json.dumps({'id': obj_id,
+                                'obj': serialize(obj)}) + "\n")
+
+    def compact(self, s_class: str, objs: dict):
+        """
+        Background compaction from a copy of the objects: the lines
+        appended meanwhile are kept after the copied objects
+        """
+        f = self.open_tmp(self.log_path(s_class))
+        try:
+            self.write(f, objs)
+            with self.lock(s_class):
+                f.writelines(self.compacting[s_class])
+                self.compacted_size[s_class] = f.tell()
+                self.commit(f, self.log_path(s_class))
+        finally:
+            self.discard(f)
+            with self.lock(s_class):
+                del self.compacting[s_class]
+
+    def save_all(self, s_class: str, objs: dict):
+        """
+        Store all objects by compacting the log right away
+        """
+        f = self.open_tmp(self.log_path(s_class))
+        try:
+            with self.lock(s_class):
+                self.write(f, objs)
+                self.compacted_size[s_class] = f.tell()
+                self.commit(f, self.log_path(s_class))
+        finally:
+            self.discard(f)
+
+    def save(self, s_class: str, objs: dict, obj):
+        """
+        Append a new or updated object
+        """
+        self.append(s_class, objs, {'id': obj.id, 'obj': obj.to_json(True)})
+
+    def remove(self, s_class: str, objs: dict, obj_id: str):
+        """
+        Append the removal of an object
+        """
+        self.append(s_class, objs, {'id': obj_id, 'removed': True})
+
+
+class SQLiteStorage():
+    """
+    Stores each class as a table of a SQLite database in WAL mode,
+    shared by all the processes using the same database file.
+    Rows hold the object JSON and one indexed column per indexed
+    attribute; objects are read from the database on each query
+    instead of being kept in memory
+    """
+
+    shared = True
+
+    def __init__(self, db_path: str = SQLITE_PATH,
+                 durability: Durability = None):
+        """
+        Constructor Method
+        """
+        self.db_path = db_path
+        self.durability = durability or Durability()
+        self.local = threading.local()
+        self.columns = {}
+        self.lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        Connection of the current thread
+        """
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            synchronous = "FULL" if self.durability.mode == "always" \
+                else "NORMAL"
+            connection.execute("PRAGMA synchronous={}".format(synchronous))
+            self.local.connection = connection
+        return connection
+
+    def table(self, s_class: str, indexed: tuple = (),
+              index_value=None) -> str:
+        """
+        Create the table of a class, with an indexed column for each
+        attribute of indexed, and return its quoted name
+        A new column is filled from the JSON of the existing rows,
+        through index_value(JSON dictionary, attribute) if given
+        """
+        table = '"{}"'.format(s_class)
+        columns = self.columns.get(s_class)
+        if columns is not None and columns.issuperset(indexed):
+            return table
+
+        with self.lock:
+            connection = self.connection
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS {} "
+                "(id TEXT PRIMARY KEY, json TEXT NOT NULL)".format(table))
+            columns = {row[1] for row in connection.execute(
+                "PRAGMA table_info({})".format(table))}
+            for attribute in indexed:
+                if attribute in columns:
+                    continue
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    connection.execute("ALTER TABLE {} ADD COLUMN \"{}\""
+                                       .format(table, attribute))
+                    self.backfill(table, attribute, index_value)
+                    connection.execute("COMMIT")
+                except sqlite3.OperationalError:
+                    # added meanwhile by another process
+                    connection.execute("ROLLBACK")
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS \"{0}_{1}\" ON {2} (\"{1}\")"
+                    .format(s_class, attribute, table))
+                columns.add(attribute)
+            self.columns[s_class] = columns
+        return table
+
+    def backfill(self, table: str, attribute: str, index_value=None):
+        """
+        Fill the new column of attribute from the JSON of the rows
+        """
+        connection = self.connection
+        if index_value is None:
+            connection.execute(
+                "UPDATE {0} SET \"{1}\" = json_extract(json, '$.{1}')"
+                .format(table, attribute))
+            return
+        rows = connection.execute(
+            "SELECT id, json FROM {}".format(table)).fetchall()
+        connection.executemany(
+            "UPDATE {} SET \"{}\" = ? WHERE id = ?".format(table, attribute),
+            [(index_value(json.loads(obj_json), attribute), obj_id)
+             for obj_id, obj_json in rows])
+
+    def reload(self, s_class: str, full: bool = False):
+        """
+        Nothing to reload: queries always read the database
+        """
+        return None
+
+    def save_all(self, s_class: str, objs: dict):
+        """
+        Objects are stored when saved: nothing left to store
+        """
+
+    def save(self, s_class: str, objs: dict, obj):
+        """
+        Insert or replace an object
+        """
+        indexed = obj.INDEXED_ATTRIBUTES
+        index_value = obj._index_value
+        table = self.table(s_class, indexed, index_value)
+        columns = "".join(', "{}"'.format(attribute) for attribute in indexed)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO {} (id, json{}) VALUES (?, ?{})".format(
+                table, columns, ", ?" * len(indexed)),
+            [obj.id, json.dumps(obj.to_json(True))] +
+            [index_value(obj, attribute) for attribute in indexed])
+
+    def remove(self, s_class: str, objs: dict, obj_id: str):
+        """
+        Delete an object
+        """
+        self.connection.execute(
+            "DELETE FROM {} WHERE id = ?".format(self.table(s_class)),
+            (obj_id,))
+
+    def get(self, s_class: str, obj_id: str) -> Optional[dict]:
+        """
+        Return the JSON dictionary of an object by ID
+        """
+        row = self.connection.execute(
+            "SELECT json FROM {} WHERE id = ?".format(self.table(s_class)),
+            (obj_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def query(self, select: str, s_class: str, indexed: tuple,
+              attributes: dict, index_value=None) -> sqlite3.Cursor:
+        """
+        Run select on the rows matching the indexed attributes
+        of attributes, or on all rows
+        """
+        table = self.table(s_class, indexed, index_value)
+        where = [k for k in attributes if k in indexed]
+        query = "SELECT {} FROM {}".format(select, table)
+        if where:
+            try:
+                return self.connection.execute(
+                    query + " WHERE " + " AND ".join(
+                        '"{}" IS ?'.format(k) for k in where),
+                    [attributes[k] for k in where])
+            except (sqlite3.InterfaceError, sqlite3.ProgrammingError):
+                # value of a type SQLite can't compare
+                pass
+        return self.connection.execute(query)
+
+    def search(self, s_class: str, indexed: tuple,
+               attributes: dict, index_value=None) -> List[dict]:
+        """
+        Return the JSON dictionaries of the objects matching the
+        indexed attributes of attributes, or of all objects
+        """
+        return [json.loads(row[0]) for row in self.query(
+            "json", s_class, indexed, attributes, index_value)]
+
+    def count(self, s_class: str, indexed: tuple = (),
+              attributes: dict = {}, index_value=None) -> int:
+        """
+        Count the objects of a class matching the indexed
+        attributes of attributes
+        """
+        return self.query("COUNT(*)", s_class, indexed, attributes,
+                          index_value).fetchone()[0]
+
+
+def get_storage() -> FileStorage:
+    """
+    Storage engine selected by the STORAGE_TYPE environment variable:
+    "log" for LogStorage, "sqlite" for SQLiteStorage (database file
+    STORAGE_SQLITE_PATH), FileStorage otherwise.
+    STORAGE_FSYNC sets the Durability mode ("none" by default)
+    and STORAGE_FSYNC_INTERVAL_MS its batch interval
+    """
+    try:
+        interval_ms = float(getenv("STORAGE_FSYNC_INTERVAL_MS"))
+    except Exception:
+        interval_ms = FSYNC_INTERVAL_MS
+    durability = Durability(getenv("STORAGE_FSYNC", "none"), interval_ms)
+
+    if getenv("STORAGE_TYPE") == "sqlite":
+        return SQLiteStorage(getenv("STORAGE_SQLITE_PATH", SQLITE_PATH),
+                             durability)
+    if getenv("STORAGE_TYPE") == "log":
+        try:
+            compact_size = int(getenv("STORAGE_LOG_COMPACT_SIZE"))
+        except Exception:
+            compact_size = LOG_COMPACT_SIZE
+        return LogStorage(compact_size, durability)
+    return FileStorage(durability)
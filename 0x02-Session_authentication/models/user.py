@@ -2,15 +2,51 @@
 """
 User module
 """
+import bcrypt
 import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from models.base import Base
 
 
+_upgrades = ThreadPoolExecutor(max_workers=1)
+
+
+def is_legacy_hash(hashed: str) -> bool:
+    """
+    Password hashes are either bcrypt hashes ($2b$<cost>$...)
+    or legacy unsalted SHA256 hex digests
+    """
+    return not hashed.startswith("$2")
+
+
+def password_scheme(hashed: str) -> str:
+    """
+    Scheme of a password hash: legacy, bcrypt, or None without password
+    """
+    if hashed is None:
+        return None
+    return "legacy" if is_legacy_hash(hashed) else "bcrypt"
+
+
+def _log_upgrade_error(future):
+    """
+    Log the failure of a background password upgrade
+    """
+    if not future.cancelled() and future.exception() is not None:
+        logging.getLogger(__name__).error(
+            "Password upgrade failed", exc_info=future.exception())
+
+
 class User(Base):
     """
     User class
     """
 
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+
+    INDEXED_ATTRIBUTES = ("email", "password_scheme")
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a User instance
@@ -31,23 +67,69 @@ class User(Base):
     @password.setter
     def password(self, pwd: str):
         """
-        Setter of a new password: encrypt in SHA256
+        Setter of a new password: encrypt with bcrypt
         """
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
-            self._password = hashlib.sha256(pwd.encode()).hexdigest().lower()
+            self._password = bcrypt.hashpw(pwd.encode(),
+                                           bcrypt.gensalt()).decode()
+
+    @property
+    def password_scheme(self) -> str:
+        """
+        Scheme of the password hash, indexed to count legacy hashes
+        """
+        return password_scheme(self._password)
+
+    @classmethod
+    def _index_value(cls, obj, attribute: str):
+        """
+        Password scheme computed from the hash of a JSON dictionary
+        """
+        if attribute == "password_scheme" and type(obj) is dict:
+            return password_scheme(obj.get('_password'))
+        return super()._index_value(obj, attribute)
 
     def is_valid_password(self, pwd: str) -> bool:
         """
         Validate a password
+        A valid legacy SHA256 password is upgraded to bcrypt
+        in the background
         """
         if pwd is None or type(pwd) is not str:
             return False
         if self.password is None:
             return False
         pwd_e = pwd.encode()
-        return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
+        if not is_legacy_hash(self.password):
+            return bcrypt.checkpw(pwd_e, self.password.encode())
+        if hashlib.sha256(pwd_e).hexdigest().lower() != self.password:
+            return False
+        _upgrades.submit(self._upgrade_password, pwd, self.password) \
+            .add_done_callback(_log_upgrade_error)
+        return True
+
+    def _upgrade_password(self, pwd: str, legacy: str):
+        """
+        Replace a legacy hash by a bcrypt hash of the same password,
+        unless the password changed or the user was removed meanwhile
+        """
+        hashed = bcrypt.hashpw(pwd.encode(), bcrypt.gensalt()).decode()
+        user = User.get(self.id)
+        if user is None or user.password != legacy:
+            return
+        user._password = hashed
+        user.save()
+
+    @classmethod
+    def legacy_password_count(cls) -> int:
+        """
+        Count the users whose password is still a legacy SHA256 hash
+        Reads the password_scheme index, kept up to date by
+        load, save and remove, and builds no user
+        """
+        return cls.count({'password_scheme': 'legacy'})
 
     def display_name(self) -> str:
         """
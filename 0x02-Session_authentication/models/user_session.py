@@ -10,6 +10,10 @@ class UserSession(Base):
     User Session Class
     """
 
+    __slots__ = ('user_id', 'session_id')
+
+    INDEXED_ATTRIBUTES = ("session_id",)
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Constructor Method
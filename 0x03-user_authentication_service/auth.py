@@ -3,12 +3,69 @@
 Module for Authentication
 """
 import bcrypt
+import time
+from os import getenv
 from sqlalchemy.orm.exc import NoResultFound
 from db import DB
 from uuid import uuid4
 from user import User
 
 
+BCRYPT_MIN_ROUNDS = 12
+BCRYPT_MAX_ROUNDS = 16
+BCRYPT_BUDGET_MS = 250
+
+
+def calibrate_rounds(budget_ms: float = BCRYPT_BUDGET_MS) -> int:
+    """
+    Times bcrypt on this machine and picks the cost factor.
+    It never goes below BCRYPT_MIN_ROUNDS (bcrypt's default cost),
+    so a loaded node or a small budget can't produce weak hashes.
+    0x00-personal_data/filtered_logger.py keeps an identical copy:
+    the projects are deployed separately and share no package.
+    Args:
+        budget_ms (float): The latency budget of one hash in milliseconds.
+    Returns:
+        int: The highest cost factor that hashes within budget_ms.
+    """
+    rounds = BCRYPT_MIN_ROUNDS
+    while rounds < BCRYPT_MAX_ROUNDS:
+        salt = bcrypt.gensalt(rounds + 1)
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", salt)
+        if (time.perf_counter() - start) * 1000 > budget_ms:
+            break
+        rounds += 1
+    return rounds
+
+
+_rounds = None
+
+
+def _bcrypt_rounds() -> int:
+    """
+    Returns the cost factor for new hashes, calibrated once
+    against the BCRYPT_BUDGET_MS environment variable.
+    """
+    global _rounds
+
+    if _rounds is None:
+        budget_ms = float(getenv("BCRYPT_BUDGET_MS", BCRYPT_BUDGET_MS))
+        _rounds = calibrate_rounds(budget_ms)
+    return _rounds
+
+
+def _needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Checks whether a hash was made with a stale cost factor.
+    Args:
+        hashed_password (bytes): A bcrypt hash.
+    Returns:
+        bool: True if its cost is below the calibrated one.
+    """
+    return int(hashed_password.split(b"$")[2]) < _bcrypt_rounds()
+
+
 def _hash_password(password: str) -> bytes:
     """
     Hashes the given password using bcrypt
@@ -20,7 +77,8 @@ def _hash_password(password: str) -> bytes:
     """
     password_bytes = password.encode('utf-8')
 
-    hashed_pwd = bcrypt.hashpw(password_bytes, bcrypt.gensalt())
+    hashed_pwd = bcrypt.hashpw(password_bytes,
+                               bcrypt.gensalt(_bcrypt_rounds()))
 
     return hashed_pwd
 
@@ -61,10 +119,17 @@ class Auth:
          password - the password of the user
         If email exists, check the password with bcrypt.checkpw.
         If it matches return True, else return False
+        A matching hash with a stale cost factor is replaced
+        by a fresh hash of the password.
         """
         try:
             user = self._db.find_user_by(email=email)
             if bcrypt.checkpw(password.encode('utf-8'), user.hashed_password):
+                if _needs_rehash(user.hashed_password):
+                    self._db.update_user(
+                        user.id,
+                        hashed_password=_hash_password(password)
+                        )
                 return True
             return False
         except NoResultFound: